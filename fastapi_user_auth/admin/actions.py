@@ -3,7 +3,7 @@ from typing import Any, Dict, List, Union
 
 from casbin import AsyncEnforcer
 from fastapi_amis_admin import amis
-from fastapi_amis_admin.admin import FormAdmin, ModelAction, PageSchemaAdmin
+from fastapi_amis_admin.admin import ModelAction, PageSchemaAdmin
 from fastapi_amis_admin.amis import SchemaNode
 from fastapi_amis_admin.amis.components import ActionType, FormItem
 from fastapi_amis_admin.amis.constants import LevelEnum
@@ -51,39 +51,24 @@ def get_admin_select_permission_rows(admin: PageSchemaAdmin) -> List[Dict[str, A
 @lru_cache()
 def get_admin_field_permission_rows(admin: PageSchemaAdmin, action: str) -> List[Dict[str, Any]]:
     """获取指定页面权限的字段权限,用于amis组件"""
-    rows = []
-    fields = {}
-    if isinstance(admin, AuthFieldModelAdmin):  # 模型管理
-        if action == "list":  # 列表展示模型
-            fields = admin.list_permission_fields
-        elif action == "filter":  # 列表筛选模型
-            fields = admin.filter_permission_fields
-        elif action == "create":  # 创建模型
-            fields = admin.create_permission_fields
-        elif action == "update":  # 更新模型
-            fields = admin.update_permission_fields
-        elif action == "read":  # 详情模型
-            fields = admin.read_permission_fields
-        else:
-            pass
-        if not fields:
-            return []
-        rows.append(
-            {
-                "label": _("All"),  # 全部
-                "rol": f"{admin.unique_id}#page:{action}:*#page:{action}",
-            }
-        )
-        rows.extend(
+    if not isinstance(admin, AuthFieldModelAdmin):  # 模型管理. todo 表单管理(FormAdmin)
+        return []
+    fields = admin.get_action_permission_fields(action)
+    if not fields:
+        return []
+    return [
+        {
+            "label": _("All"),  # 全部
+            "rol": f"{admin.unique_id}#page:{action}:*#page:{action}",
+        },
+        *(
             {
                 "label": label,
                 "rol": f"{admin.unique_id}#page:{action}:{name}#page:{action}",
             }
             for name, label in fields.items()
-        )
-    elif isinstance(admin, FormAdmin):  # todo 表单管理
-        pass
-    return rows
+        ),
+    ]
 
 
 class BaseSubAction(ModelAction):
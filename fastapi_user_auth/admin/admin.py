@@ -59,6 +59,7 @@ from fastapi_user_auth.auth.models import (
 )
 from fastapi_user_auth.auth.schemas import SystemUserEnum, UserLoginOut
 from fastapi_user_auth.mixins.admin import AuthFieldModelAdmin, AuthSelectModelAdmin
+from fastapi_user_auth.utils.casbin import update_policy_version
 
 
 def attach_page_head(page: Page) -> Page:
@@ -392,6 +393,7 @@ class CasbinRuleAdmin(ReadOnlyModelAdmin):
 
     async def load_policy(self):
         await self.site.auth.enforcer.load_policy()
+        update_policy_version()
         # 更新站点资源分组
         await update_casbin_site_grouping(self.site.auth.enforcer, self.site)
 
@@ -1,6 +1,6 @@
-from copy import copy
-from functools import lru_cache
+from collections import deque
 from typing import Any, Callable, Dict, List, Tuple
+from weakref import WeakKeyDictionary
 
 from casbin import AsyncEnforcer
 from fastapi_amis_admin.admin import FormAdmin, ModelAdmin, PageSchemaAdmin
@@ -8,14 +8,41 @@ from fastapi_amis_admin.admin.admin import AdminGroup, BaseActionAdmin, BaseAdmi
 from fastapi_amis_admin.utils.translation import i18n as _
 
 from fastapi_user_auth.auth.schemas import SystemUserEnum
-from fastapi_user_auth.utils.casbin import permission_encode, permission_enforce
+from fastapi_user_auth.utils.casbin import permission_encode, permission_enforce, update_policy_version
+
+_admin_action_options_cache: "WeakKeyDictionary[AdminGroup, List[Dict[str, Any]]]" = WeakKeyDictionary()
+
+
+def _option_sort_key(option: Dict[str, Any]) -> int:
+    return option["sort"] or 0
+
+
+def _get_admin_action_children(admin: BaseActionAdmin) -> List[Dict[str, Any]]:
+    """获取页面动作权限"""
+    children = []
+    if isinstance(admin, ModelAdmin):
+        children.append({"label": _("View list"), "value": permission_encode(admin.unique_id, "page:list", "page")})  # 查看列表
+        children.append({"label": _("Filter list"), "value": permission_encode(admin.unique_id, "page:filter", "page")})  # 筛选列表
+    elif isinstance(admin, FormAdmin) and "submit" not in admin.registered_admin_actions:
+        children.append({"label": _("submit"), "value": permission_encode(admin.unique_id, "page:submit", "page")})  # 提交
+    for admin_action in admin.registered_admin_actions.values():
+        # todo admin_action 下可能有多个action,需要遍历
+        children.append(
+            {
+                "label": admin_action.label,
+                "value": permission_encode(admin.unique_id, f"page:{admin_action.name}", "page"),
+            }
+        )
+    return children
 
 
-@lru_cache()
 def get_admin_action_options(
     group: AdminGroup,
 ) -> List[Dict[str, Any]]:
-    """获取全部页面权限,用于amis组件"""
+    """获取全部页面权限,用于amis组件.结果按页面分组缓存,子分组同样命中缓存"""
+    options = _admin_action_options_cache.get(group)
+    if options is not None:
+        return options
     options = []
     for admin in group:  # 这里已经同步了数据库,所以只从这里配置权限就行了
         admin: PageSchemaAdmin
@@ -27,47 +54,37 @@ def get_admin_action_options(
             "sort": admin.page_schema.sort,
         }
         if isinstance(admin, BaseActionAdmin):
-            item["children"] = []
-            if isinstance(admin, ModelAdmin):
-                item["children"].append(
-                    {"label": _("View list"), "value": permission_encode(admin.unique_id, "page:list", "page")}
-                )  # 查看列表
-                item["children"].append(
-                    {"label": _("Filter list"), "value": permission_encode(admin.unique_id, "page:filter", "page")}
-                )  # 筛选列表
-            elif isinstance(admin, FormAdmin) and "submit" not in admin.registered_admin_actions:
-                item["children"].append(
-                    {"label": _("submit"), "value": permission_encode(admin.unique_id, "page:submit", "page")}
-                )  # 提交
-            for admin_action in admin.registered_admin_actions.values():
-                # todo admin_action 下可能有多个action,需要遍历
-                item["children"].append(
-                    {
-                        "label": admin_action.label,
-                        "value": permission_encode(admin.unique_id, f"page:{admin_action.name}", "page"),
-                    }
-                )
+            item["children"] = _get_admin_action_children(admin)
         elif isinstance(admin, AdminGroup):
             item["children"] = get_admin_action_options(admin)
         options.append(item)
     if options:
-        options.sort(key=lambda p: p["sort"] or 0, reverse=True)
+        options.sort(key=_option_sort_key, reverse=True)
+    _admin_action_options_cache[group] = options
     return options
 
 
+get_admin_action_options.cache_clear = _admin_action_options_cache.clear  # 兼容lru_cache接口,清除缓存
+
+
 def filter_options(options: List[Dict[str, Any]], filter_func: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
-    """过滤选项,包含子选项.如果选项的children为空,则删除该选项"""
+    """过滤选项,包含子选项.如果选项的children为空,则删除该选项.不修改原选项,没有选项被过滤时返回原列表"""
     result = []
+    changed = False
     for option in options:
-        option = copy(option)  # 防止children被修改
         has_children = False
-        if option.get("children"):
-            option["children"] = filter_options(option["children"], filter_func)
-            has_children = bool(option["children"])
+        children = option.get("children")
+        if children:
+            new_children = filter_options(children, filter_func)
+            has_children = bool(new_children)
+            if new_children is not children:  # 子选项被过滤,复制选项,防止修改缓存
+                option = {**option, "children": new_children}
+                changed = True
         if not filter_func(option) and not has_children:  # 没有父级权限,并且没有子级权限
+            changed = True
             continue
         result.append(option)
-    return result
+    return result if changed else options
 
 
 def get_admin_action_options_by_subject(
@@ -88,12 +105,14 @@ def get_admin_action_options_by_subject(
 # 获取全部admin上下级关系
 def get_admin_grouping(group: AdminGroup) -> List[Tuple[str, str]]:
     children = []
-    for admin in group:
-        if admin is admin.app:
-            continue
-        children.append((admin.app.unique_id, admin.unique_id))
-        if isinstance(admin, AdminGroup):
-            children.extend(get_admin_grouping(admin))
+    groups = deque([group])
+    while groups:
+        for admin in groups.popleft():
+            if admin is admin.app:
+                continue
+            children.append((admin.app.unique_id, admin.unique_id))
+            if isinstance(admin, AdminGroup):
+                groups.append(admin)
     return children
 
 
@@ -103,9 +122,12 @@ async def update_casbin_site_grouping(enforcer: AsyncEnforcer, site: BaseAdminSi
     roles = enforcer.get_filtered_named_grouping_policy("g2", 0)
     old_roles = {tuple(role) for role in roles}
     new_roles = set(get_admin_grouping(site))
+    if old_roles == new_roles:  # 资源角色没有变化
+        return
     remove_roles = old_roles - new_roles
     add_roles = new_roles - old_roles
     if remove_roles:  # 删除旧的资源角色
         await enforcer.remove_named_grouping_policies("g2", [list(role) for role in remove_roles])
     if add_roles:  # 添加新的资源角色
         await enforcer.add_named_grouping_policies("g2", add_roles)
+    update_policy_version()
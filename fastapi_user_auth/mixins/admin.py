@@ -1,18 +1,203 @@
-from fastapi_amis_admin.admin import BaseAuthFieldModelAdmin, BaseAuthSelectModelAdmin
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+
+from fastapi_amis_admin.admin import AdminApp, BaseAuthFieldModelAdmin, BaseAuthSelectModelAdmin, FieldPermEnum
+from fastapi_amis_admin.admin.extensions.utils import get_schema_fields_name_label
+from fastapi_amis_admin.amis import FormItem, SchemaNode, TableColumn
+from fastapi_amis_admin.crud.base import SchemaCreateT, SchemaFilterT, SchemaReadT, SchemaUpdateT
+from fastapi_amis_admin.crud.parser import TableModelT
+from fastapi_amis_admin.crud.schema import CrudEnum, ItemListSchema
+from fastapi_amis_admin.utils.pydantic import PYDANTIC_V2, ModelField
+from fastapi_amis_admin.utils.translation import i18n as _
+from sqlalchemy.engine import Result
 from sqlalchemy.sql import Select
 from starlette.requests import Request
 
 from fastapi_user_auth.auth.schemas import SystemUserEnum
+from fastapi_user_auth.utils.casbin import get_policy_version
+
+
+def _merge_perm_fields(perm_fields: Optional[Dict[Union[FieldPermEnum, int], Sequence[str]]], perm: int) -> FrozenSet[str]:
+    """合并包含指定字段权限的全部字段"""
+    return frozenset(field for k, fields in (perm_fields or {}).items() if (k & perm) == perm for field in fields)
 
 
 class AuthFieldModelAdmin(BaseAuthFieldModelAdmin):
+    """字段权限管理.
+    以下钩子方法完全替换BaseAuthFieldModelAdmin中的实现,通过super(BaseAuthFieldModelAdmin, self)
+    有意跳过父类的逐字段权限判断,直接调用更上层的实现.升级fastapi-amis-admin时,需要同步检查这些方法.
+    注意:拥有全部列表字段权限时,on_list_after返回的data.items为schema_list实例,否则为已过滤字段的字典,
+    子类重写on_list_after处理列表数据时需兼容这两种类型.
+    """
+
+    deny_fields_cache_ttl: float = 60
+    """没有权限的字段缓存时间(秒),设置为0则不缓存.
+    通过enforcer(使用本库的Adapter且开启auto_save)或权限工具函数更新casbin规则后,缓存自动失效;
+    使用其他adapter,关闭auto_save或在其他进程中修改规则时,缓存最长在过期后失效"""
+    deny_fields_cache_maxsize: int = 10000
+    """没有权限的字段缓存最大数量"""
+    _permission_fields_spec: Dict[str, Tuple[str, str, str, FieldPermEnum]] = {
+        "list": ("schema_list", "list_permission_fields", "List display", FieldPermEnum.LIST),
+        "filter": ("schema_filter", "filter_permission_fields", "List filter", FieldPermEnum.FILTER),
+        "create": ("schema_create", "create_permission_fields", "Create", FieldPermEnum.CREATE),
+        "read": ("schema_read", "read_permission_fields", "Read", FieldPermEnum.READ),
+        "update": ("schema_update", "update_permission_fields", "Update", FieldPermEnum.UPDATE),
+    }
+    """动作 -> (模型属性名, 权限字段属性名, 字段标签前缀, 字段权限)"""
+
+    def __init__(self, app: "AdminApp"):
+        # 动作 -> (需要验证的字段, 不需要验证的字段). 类实例化后perm_fields和perm_fields_exclude禁止再次修改
+        self._perm_fields_by_action: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {
+            action: (
+                _merge_perm_fields(self.perm_fields, perm),
+                _merge_perm_fields(self.perm_fields_exclude, perm),
+            )
+            for action, (_schema_attr, _fields_attr, _prefix, perm) in self._permission_fields_spec.items()
+        }
+        super().__init__(app)
+        # (规则版本号, 主体, 动作) -> (过期时间, 没有权限的字段)
+        self._deny_fields_cache: Dict[Tuple[int, str, str], Tuple[float, FrozenSet[str]]] = {}
+        # 当前请求中没有权限的字段缓存键
+        self._request_deny_fields_key = f"{self.unique_id}_exclude_fields"
+        # 动作 -> (字段权限前缀, 字段权限分组)
+        self._field_permission_templates: Dict[str, Tuple[str, str]] = {
+            action: (f"page:{action}:", f"page:{action}") for action in self._permission_fields_spec
+        }
+
+    def get_permission_fields(self, action: str) -> Dict[str, str]:
+        """获取权限字段"""
+        spec = self._permission_fields_spec.get(action)
+        if not spec:
+            return {}
+        schema_attr, _fields_attr, prefix, _perm = spec
+        include, exclude = self._perm_fields_by_action[action]
+        return get_schema_fields_name_label(
+            getattr(self, schema_attr),
+            prefix=_(prefix) + "-",
+            exclude_required=True,
+            exclude=exclude,
+            include=include,
+        )
+
+    def get_action_permission_fields(self, action: str) -> Dict[str, str]:
+        """获取指定动作的权限字段,未知动作返回空字典"""
+        spec = self._permission_fields_spec.get(action)
+        if not spec:
+            return {}
+        _schema_attr, fields_attr, _prefix, _perm = spec
+        return getattr(self, fields_attr)
+
     async def has_field_permission(self, request: Request, field: str, action: str = "") -> bool:
         """判断用户是否有字段权限"""
         subject = await self.site.auth.get_current_user_identity(request) or SystemUserEnum.GUEST
-        action += ""
-        effect = self.site.auth.enforcer.enforce("u:" + subject, self.unique_id, f"page:{action}:{field}", f"page:{action}")
+        return await self._has_field_permission_with_subject(subject, field, action)
+
+    async def _has_field_permission_with_subject(self, subject: str, field: str, action: str = "") -> bool:
+        """判断指定主体是否有字段权限,无需再次获取当前用户"""
+        action = getattr(action, "value", action)  # 兼容CrudEnum
+        obj_prefix, group = self._field_permission_templates.get(action) or (f"page:{action}:", f"page:{action}")
+        effect = self.site.auth.enforcer.enforce("u:" + subject, self.unique_id, obj_prefix + field, group)
         return effect
 
+    async def get_deny_fields(self, request: Request, action: str = None) -> FrozenSet[str]:
+        """获取没有权限的字段.一次性批量执行全部字段的casbin规则.
+        返回值在请求及跨请求缓存中共享,为不可变集合,需要修改时请先复制"""
+        action = getattr(action, "value", action)  # 兼容CrudEnum
+        request_cache = request.scope.setdefault(self._request_deny_fields_key, {})
+        if action in request_cache:
+            return request_cache[action]
+        check_fields = list(self.get_action_permission_fields(action).keys())
+        fields = frozenset()
+        if check_fields:
+            subject = await self.site.auth.get_current_user_identity(request) or SystemUserEnum.GUEST
+            fields = self._get_subject_deny_fields(subject, action, check_fields)
+        request_cache[action] = fields
+        return fields
+
+    def _get_subject_deny_fields(self, subject: str, action: str, check_fields: List[str]) -> FrozenSet[str]:
+        """获取指定主体没有权限的字段,跨请求缓存,casbin规则版本号变化后失效"""
+        key = (get_policy_version(), subject, action)
+        now = time.monotonic()
+        cached = self._deny_fields_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        sub = "u:" + subject
+        obj_prefix, group = self._field_permission_templates[action]
+        rvals = [(sub, self.unique_id, obj_prefix + field, group) for field in check_fields]
+        effects = self.site.auth.enforcer.batch_enforce(rvals)
+        fields = frozenset(field for field, effect in zip(check_fields, effects) if not effect)
+        if self.deny_fields_cache_ttl > 0:
+            if len(self._deny_fields_cache) >= self.deny_fields_cache_maxsize:
+                self._deny_fields_cache.clear()
+            self._deny_fields_cache[key] = (now + self.deny_fields_cache_ttl, fields)
+        return fields
+
+    async def on_list_after(self, request: Request, result: Result, data: ItemListSchema, **kwargs) -> ItemListSchema:
+        """Parse the database data query result dictionary into schema_list."""
+        exclude = await self.get_deny_fields(request, "list")  # 过滤没有权限的字段
+        data = await super(BaseAuthFieldModelAdmin, self).on_list_after(request, result, data, **kwargs)
+        if not exclude:  # 拥有全部字段权限,无需过滤
+            return data
+        if PYDANTIC_V2:
+            data.items = [item.model_dump(exclude=exclude) for item in data.items]
+        else:
+            data.items = [item.dict(exclude=exclude) for item in data.items]
+        return data
+
+    async def on_filter_pre(self, request: Request, obj: Optional[SchemaFilterT], **kwargs) -> Dict[str, Any]:
+        data = await super(BaseAuthFieldModelAdmin, self).on_filter_pre(request, obj, **kwargs)
+        if not data:
+            return data
+        exclude = await self.get_deny_fields(request, "filter")  # 过滤没有权限的字段
+        if exclude.isdisjoint(data):  # 没有提交没有权限的筛选字段
+            return data
+        return {k: v for k, v in data.items() if k not in exclude}
+
+    async def create_items(self, request: Request, items: List[SchemaCreateT]) -> List[TableModelT]:
+        """Create multiple data"""
+        exclude = await self.get_deny_fields(request, "create")
+        if exclude:
+            items = [item.copy(exclude=exclude) for item in items]  # 过滤没有权限的字段
+        return await super(BaseAuthFieldModelAdmin, self).create_items(request, items)
+
+    async def read_items(self, request: Request, item_id: List[str]) -> List[SchemaReadT]:
+        """Read multiple data"""
+        items = await super(BaseAuthFieldModelAdmin, self).read_items(request, item_id)
+        exclude = await self.get_deny_fields(request, "read")  # 过滤没有权限的字段
+        if not exclude:
+            return items
+        return [item.copy(exclude=exclude) for item in items]
+
+    async def on_update_pre(
+        self,
+        request: Request,
+        obj: SchemaUpdateT,
+        item_id: Union[List[str], List[int]],
+        **kwargs,
+    ) -> Dict[str, Any]:
+        exclude = await self.get_deny_fields(request, "update")  # 过滤没有权限的字段
+        if exclude:
+            obj = obj.copy(exclude=exclude)  # 过滤没有权限的字段
+        return await super(BaseAuthFieldModelAdmin, self).on_update_pre(request, obj, item_id, **kwargs)
+
+    async def get_form_item(
+        self, request: Request, modelfield: ModelField, action: CrudEnum
+    ) -> Union[FormItem, SchemaNode, None]:
+        """过滤前端创建,更新,筛选表单字段.同一请求中只在首个字段获取没有权限的字段"""
+        # action为list时,表示列表展示字段.否则为筛选表单字段
+        act = "filter" if action == "list" else action
+        exclude = await self.get_deny_fields(request, act)  # 获取没有权限的字段,同一请求中从缓存读取
+        if (modelfield.alias or modelfield.name) in exclude:
+            return None
+        return await super(BaseAuthFieldModelAdmin, self).get_form_item(request, modelfield, action)
+
+    async def get_list_column(self, request: Request, modelfield: ModelField) -> Optional[TableColumn]:
+        """过滤前端展示字段.同一请求中只在首个字段获取没有权限的字段"""
+        exclude = await self.get_deny_fields(request, "list")  # 获取没有权限的字段,同一请求中从缓存读取
+        if (modelfield.alias or modelfield.name) in exclude:
+            return None
+        return await super(BaseAuthFieldModelAdmin, self).get_list_column(request, modelfield)
+
 
 class AuthSelectModelAdmin(BaseAuthSelectModelAdmin):
     async def has_select_permission(self, request: Request, name: str) -> bool:
@@ -8,6 +8,21 @@ from sqlalchemy.orm import Session
 from fastapi_user_auth.auth.models import CasbinRule
 from fastapi_user_auth.auth.schemas import SystemUserEnum
 
+# casbin规则版本号,每次更新规则后递增.用于使依赖casbin规则的缓存失效
+_policy_version = 0
+
+
+def get_policy_version() -> int:
+    """获取casbin规则版本号"""
+    return _policy_version
+
+
+def update_policy_version() -> int:
+    """casbin规则已更新,递增版本号"""
+    global _policy_version
+    _policy_version += 1
+    return _policy_version
+
 
 # 执行casbin字符串规则
 def permission_enforce(enforcer: AsyncEnforcer, subject: str, permission: str) -> bool:
@@ -18,7 +33,9 @@ def permission_enforce(enforcer: AsyncEnforcer, subject: str, permission: str) -
 # 将casbin规则转化为字符串
 def permission_encode(*field_values: str) -> str:
     """将casbin规则转化为字符串,从v1开始"""
-    return "#".join(val for val in field_values if val is not None)
+    if None in field_values:
+        field_values = [val for val in field_values if val is not None]
+    return "#".join(field_values)
 
 
 # 将字符串转化为casbin规则
@@ -32,8 +49,9 @@ async def get_subject_page_permissions(enforcer: AsyncEnforcer, *, subject: str,
     if implicit:
         permissions = await enforcer.get_implicit_permissions_for_user(subject)
         permissions = [perm for perm in permissions if perm[-2] == "page"]  # 只获取page权限
-    else:
-        permissions = enforcer.get_filtered_policy(0, subject, "", "", "page")
+        # 多个角色可能拥有相同的权限,去重并保持顺序
+        return list(dict.fromkeys(permission_encode(*permission[1:]) for permission in permissions))
+    permissions = enforcer.get_filtered_policy(0, subject, "", "", "page")
     return [permission_encode(*permission[1:]) for permission in permissions]
 
 
@@ -44,6 +62,7 @@ async def update_subject_roles(enforcer: AsyncEnforcer, *, subject: str, role_ke
     await enforcer.delete_roles_for_user(subject)
     if new_roles:
         await enforcer.add_grouping_policies(new_roles)
+    update_policy_version()
 
 
 async def update_subject_page_permissions(
@@ -53,18 +72,24 @@ async def update_subject_page_permissions(
     permissions: List[str],
 ) -> List[str]:
     """根据指定subject主体更新casbin规则,会删除旧的规则,添加新的规则"""
-    # 获取主体的页面权限
-    old_rules = enforcer.get_filtered_policy(0, subject, "", "", "page")
-    old_rules = {tuple(i) for i in old_rules}
-    # 添加新的权限
+    # 新的权限
     new_rules = set()
     for permission in permissions:
         perm = permission_decode(permission)
         if len(perm) == 3:  # 默认为allow
             perm.append("allow")
         new_rules.add((subject, *perm))
-    remove_rules = old_rules - new_rules
-    add_rules = new_rules - old_rules
+    # 遍历主体的页面权限,一次比较得出需要删除和添加的权限
+    add_rules = set(new_rules)
+    remove_rules = set()
+    for rule in enforcer.get_filtered_policy(0, subject, "", "", "page"):
+        rule = tuple(rule)
+        if rule in new_rules:
+            add_rules.discard(rule)
+        else:
+            remove_rules.add(rule)
+    if not remove_rules and not add_rules:  # 权限没有变化
+        return permissions
     if remove_rules:
         # 删除旧的权限
         # 注意casbin缓存的是list,不能是tuple,否则无法删除.
@@ -74,6 +99,7 @@ async def update_subject_page_permissions(
         await enforcer.remove_policies([list(rule) for rule in remove_rules])
     if add_rules:
         await enforcer.add_policies(add_rules)
+    update_policy_version()
     return permissions
 
 
@@ -179,6 +205,7 @@ async def update_subject_data_permissions(
     await enforcer.remove_filtered_policy(0, subject, v1, "", v2, "")
     if add_rules:
         await enforcer.add_policies(add_rules)
+    update_policy_version()
     return "success"
 
 
@@ -35,6 +35,13 @@ class DefaultCasbinRule(Base):
         return '<CasbinRule {}: "{}">'.format(self.id, str(self))
 
 
+def _policy_changed():
+    """存储的casbin规则已更新,使依赖casbin规则的缓存失效"""
+    from fastapi_user_auth.utils.casbin import update_policy_version  # 防止循环导入
+
+    update_policy_version()
+
+
 class AdapterException(Exception):
     """AdapterException"""
 
@@ -91,6 +98,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
         result = await self.db.async_scalars(select(self._db_class))
         for line in result:
             persist.load_policy_line(str(line), model)
+        _policy_changed()
 
     def is_filtered(self) -> bool:
         """returns whether the adapter is filtered or not."""
@@ -106,6 +114,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
         for line in result:
             persist.load_policy_line(str(line), model)
         self._filtered = True
+        _policy_changed()
 
     def filter_query(self, querydb: Select, filter_: Filter) -> Select:
         """filters the query based on the filter_."""
@@ -141,6 +150,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
         obj = self.parse_rule(ptype, rule)
         self.db.add(obj)
         await self.db.async_commit()
+        _policy_changed()
 
     async def add_policies(self, sec: str, ptype: str, rules: Iterable[Tuple[str]]) -> None:
         """adds a policy rules to the storage."""
@@ -151,6 +161,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
             return
         await self.db.async_execute(insert(self._db_class).values(values))
         await self.db.async_commit()
+        _policy_changed()
 
     # pylint: disable=unused-argument
     async def remove_policy(self, sec: str, ptype: str, rule: Iterable[str]) -> bool:
@@ -164,6 +175,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
             query = query.filter(getattr(self._db_class, f"v{i}") == v)
         res = (await self.db.async_execute(query)).rowcount  # type: ignore
         await self.db.async_commit()
+        _policy_changed()
         return res > 0  # pragma: no cover
 
     async def remove_policies(self, sec: str, ptype: str, rules: List[Tuple[str]]) -> None:
@@ -181,6 +193,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
         query = query.filter(or_(*_rules))
         await self.db.async_execute(query)
         await self.db.async_commit()
+        _policy_changed()
 
     async def remove_filtered_policy(self, sec: str, ptype: str, field_index: int, *field_values: Tuple[str]) -> bool:
         """removes policy rules that match the filter from the storage.
@@ -200,6 +213,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
                 query = query.filter(v_value == v)
         res = (await self.db.async_execute(query)).rowcount  # type: ignore
         await self.db.async_commit()
+        _policy_changed()
         return res > 0
 
     async def update_policy(self, sec: str, ptype: str, old_rule: List[str], new_rule: List[str]) -> None:
@@ -230,6 +244,7 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
             else:  # pragma: no cover
                 setattr(old_rule_line, f"v{index}", None)
         await self.db.async_commit()
+        _policy_changed()
 
     async def update_policies(
         self,
@@ -279,4 +294,5 @@ class Adapter(AsyncAdapter, AsyncUpdateAdapter):
         await self.add_policies("p", filter_.ptype[0], new_rules)
         # return deleted rules
         await self.db.async_commit()
+        _policy_changed()
         return old_rules
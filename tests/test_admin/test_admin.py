@@ -0,0 +1,224 @@
+import pytest
+from casbin import AsyncEnforcer
+from fastapi import FastAPI
+from fastapi_amis_admin.crud.schema import CrudEnum, ItemListSchema
+from fastapi_amis_admin.utils.pydantic import model_fields
+from sqlalchemy import delete, select
+from starlette.requests import Request
+
+from fastapi_user_auth.admin import AuthAdminSite
+from fastapi_user_auth.admin.actions import get_admin_field_permission_rows
+from fastapi_user_auth.admin.utils import update_casbin_site_grouping
+from fastapi_user_auth.auth.models import CasbinRule, User
+from fastapi_user_auth.utils.casbin import update_subject_data_permissions
+
+
+@pytest.fixture
+def enforcer(site: AuthAdminSite) -> AsyncEnforcer:
+    return site.auth.enforcer
+
+
+@pytest.fixture
+async def fake_data(db, app: FastAPI, site, admin_instances, enforcer: AsyncEnforcer):
+    # 清空数据
+    await db.async_execute(delete(CasbinRule))
+    user_admin_unique_id = admin_instances["user_admin"].unique_id
+    db.add_all(
+        [
+            CasbinRule(ptype="g", v0="u:admin", v1="r:admin"),
+            CasbinRule(ptype="p", v0="r:admin", v1=user_admin_unique_id, v2="page:list:email", v3="page:list", v4="allow"),
+            CasbinRule(ptype="p", v0="r:admin", v1=user_admin_unique_id, v2="page:update:email", v3="page:update", v4="deny"),
+        ]
+    )
+    await db.async_commit()
+    # 加载页面分组
+    await update_casbin_site_grouping(enforcer, site)
+    # 重新加载权限
+    await enforcer.load_policy()
+
+
+def make_request() -> Request:
+    return Request(scope={"type": "http", "headers": []})
+
+
+@pytest.fixture
+def login_as(site: AuthAdminSite, monkeypatch):
+    """模拟当前登录用户"""
+
+    def login(identity: str):
+        async def get_current_user_identity(request: Request, name: str = None) -> str:
+            return identity
+
+        monkeypatch.setattr(site.auth, "get_current_user_identity", get_current_user_identity)
+
+    return login
+
+
+@pytest.mark.parametrize("identity", ["admin", "test"])
+async def test_get_deny_fields(site: AuthAdminSite, admin_instances: dict, fake_data, login_as, identity: str):
+    login_as(identity)
+    user_admin = admin_instances["user_admin"]
+    request = make_request()
+    deny_fields = await user_admin.get_deny_fields(request, "list")
+    assert ("email" in deny_fields) is (identity != "admin")
+    deny_fields = await user_admin.get_deny_fields(request, "update")
+    assert "email" in deny_fields
+    assert "password" in deny_fields
+    # 单字段权限与批量结果一致
+    assert await user_admin.has_field_permission(request, "email", "list") is (identity == "admin")
+    assert await user_admin.get_deny_fields(request, "unknown") == set()
+    # 兼容CrudEnum动作
+    assert await user_admin.get_deny_fields(request, CrudEnum.update) == await user_admin.get_deny_fields(request, "update")
+    assert await user_admin.has_field_permission(request, "email", CrudEnum.list) is (identity == "admin")
+
+
+async def test_get_deny_fields_crud_enum(site: AuthAdminSite, admin_instances: dict, fake_data):
+    user_admin = admin_instances["user_admin"]
+    request = make_request()
+    assert await user_admin.get_deny_fields(request, CrudEnum.create) == {"email", "password"}
+    assert set(request.scope[f"{user_admin.unique_id}_exclude_fields"]) == {"create"}
+    form = await user_admin.get_list_filter_form(request)
+    assert "email" not in {item.name for item in form.body}
+
+
+async def test_get_deny_fields_cache(site: AuthAdminSite, admin_instances: dict, fake_data, login_as):
+    login_as("admin")
+    user_admin = admin_instances["user_admin"]
+    assert "email" not in await user_admin.get_deny_fields(make_request(), "list")
+    # 更新规则后,缓存失效
+    await update_subject_data_permissions(
+        site.auth.enforcer,
+        subject="r:admin",
+        permission=f"{user_admin.unique_id}#page:list#page",
+        policy_matrix=[[], [], [{"rol": f"{user_admin.unique_id}#page:list:email#page:list", "checked": True}]],
+    )
+    assert "email" in await user_admin.get_deny_fields(make_request(), "list")
+
+
+async def test_get_deny_fields_cache_enforcer(site: AuthAdminSite, admin_instances: dict, fake_data, login_as):
+    login_as("test")
+    enforcer = site.auth.enforcer
+    user_admin = admin_instances["user_admin"]
+    assert "email" in await user_admin.get_deny_fields(make_request(), "list")
+    # 直接通过enforcer更新规则后,缓存失效
+    await enforcer.add_grouping_policy("u:test", "r:admin")
+    assert "email" not in await user_admin.get_deny_fields(make_request(), "list")
+    await enforcer.remove_policy("r:admin", user_admin.unique_id, "page:list:email", "page:list", "allow")
+    assert "email" in await user_admin.get_deny_fields(make_request(), "list")
+    await enforcer.add_policy("r:admin", user_admin.unique_id, "page:list:email", "page:list", "allow")
+    assert "email" not in await user_admin.get_deny_fields(make_request(), "list")
+    await enforcer.remove_filtered_grouping_policy(0, "u:test")
+    assert "email" in await user_admin.get_deny_fields(make_request(), "list")
+
+
+async def test_get_deny_fields_batch_enforce_cache(site: AuthAdminSite, admin_instances: dict, fake_data, monkeypatch):
+    user_admin = admin_instances["user_admin"]
+    batch_enforce = site.auth.enforcer.batch_enforce
+    calls = []
+
+    def spy_batch_enforce(rvals):
+        calls.append(rvals)
+        return batch_enforce(rvals)
+
+    monkeypatch.setattr(site.auth.enforcer, "batch_enforce", spy_batch_enforce)
+    fields = await user_admin.get_deny_fields(make_request(), "update")
+    assert isinstance(fields, frozenset)
+    assert len(calls) == 1
+    # 相同主体和动作在新的请求中命中缓存,不再执行casbin规则
+    assert await user_admin.get_deny_fields(make_request(), "update") == fields
+    assert len(calls) == 1
+    await user_admin.get_deny_fields(make_request(), "list")
+    assert len(calls) == 2
+
+
+def test_get_admin_field_permission_rows(app: FastAPI, admin_instances: dict):
+    user_admin = admin_instances["user_admin"]
+    rows = get_admin_field_permission_rows(user_admin, "list")
+    assert [row["rol"] for row in rows] == [
+        f"{user_admin.unique_id}#page:list:*#page:list",
+        f"{user_admin.unique_id}#page:list:email#page:list",
+    ]
+    assert get_admin_field_permission_rows(user_admin, "read") == []
+    assert get_admin_field_permission_rows(user_admin, "unknown") == []
+    assert get_admin_field_permission_rows(admin_instances["role_admin"], "list") == []
+
+
+async def test_get_deny_fields_request_cache(site: AuthAdminSite, admin_instances: dict, fake_data):
+    user_admin = admin_instances["user_admin"]
+    request = make_request()
+    list_fields = await user_admin.get_deny_fields(request, "list")
+    update_fields = await user_admin.get_deny_fields(request, "update")
+    request_cache = request.scope[f"{user_admin.unique_id}_exclude_fields"]
+    assert request_cache == {"list": list_fields, "update": update_fields}
+    assert await user_admin.get_deny_fields(request, "list") is list_fields
+
+
+@pytest.mark.parametrize("identity", ["admin", "test"])
+async def test_get_list_columns(site: AuthAdminSite, admin_instances: dict, fake_data, login_as, identity: str):
+    login_as(identity)
+    user_admin = admin_instances["user_admin"]
+    request = make_request()
+    columns = await user_admin.get_list_columns(request)
+    assert ("email" in {column.name for column in columns}) is (identity == "admin")
+    assert "list" in request.scope[f"{user_admin.unique_id}_exclude_fields"]
+
+
+@pytest.mark.parametrize("identity", ["admin", "root"])
+async def test_on_update_pre_and_filter_pre(site: AuthAdminSite, admin_instances: dict, fake_data, login_as, identity: str):
+    login_as(identity)
+    user_admin = admin_instances["user_admin"]
+    request = make_request()
+    obj = user_admin.schema_update(email="admin@amis.work", nickname="admin")
+    data = await user_admin.on_update_pre(request, obj, item_id=[1])
+    assert data["nickname"] == "admin"
+    assert ("email" in data) is (identity == "root")
+    filters = await user_admin.on_filter_pre(request, user_admin.schema_filter(email="admin", username="admin"))
+    assert filters["username"] == "admin"
+    assert ("email" in filters) is (identity == "root")
+    # 未提交没有权限的筛选字段时,直接返回筛选条件
+    filters = await user_admin.on_filter_pre(request, user_admin.schema_filter(username="admin"))
+    assert filters == {"username": "admin"}
+
+
+@pytest.mark.parametrize("identity", ["admin", "root"])
+async def test_get_form_items(site: AuthAdminSite, admin_instances: dict, fake_data, login_as, identity: str):
+    login_as(identity)
+    user_admin = admin_instances["user_admin"]
+    request = make_request()
+    filter_form = await user_admin.get_list_filter_form(request)
+    create_form = await user_admin.get_create_form(request)
+    update_form = await user_admin.get_update_form(request)
+    filter_names = {getattr(item, "name", None) for item in filter_form.body}
+    create_names = {getattr(item, "name", None) for item in create_form.body}
+    update_names = {getattr(item, "name", None) for item in update_form.body}
+    assert "username" in filter_names
+    assert "username" in create_names
+    assert "nickname" in update_names
+    allowed = identity == "root"
+    assert ("email" in filter_names) is allowed
+    assert ("email" in create_names) is allowed
+    assert ("password" in create_names) is allowed
+    assert ("email" in update_names) is allowed
+    assert ("password" in update_names) is allowed
+    # 同一请求中按动作缓存没有权限的字段
+    assert set(request.scope[f"{user_admin.unique_id}_exclude_fields"]) >= {"filter", "create", "update"}
+    # 直接传入CrudEnum动作
+    email_field = model_fields(user_admin.schema_update)["email"]
+    assert (await user_admin.get_form_item(request, email_field, CrudEnum.update) is not None) is allowed
+
+
+@pytest.mark.parametrize("identity", ["test", "root"])
+async def test_on_list_after(site: AuthAdminSite, admin_instances: dict, fake_data, login_as, identity: str):
+    login_as(identity)
+    await site.auth.create_role_user("test")
+    user_admin = admin_instances["user_admin"]
+    result = await site.db.async_execute(select(*User.__table__.columns))
+    data = await user_admin.on_list_after(make_request(), result, ItemListSchema(items=[]))
+    item = data.items[0]
+    if identity == "root":  # 拥有全部字段权限,返回schema_list实例
+        assert isinstance(item, user_admin.schema_list)
+        assert item.username == "test"
+    else:  # 过滤没有权限的字段,返回字典
+        assert isinstance(item, dict)
+        assert item["username"] == "test"
+        assert "email" not in item
@@ -4,12 +4,14 @@ from sqlalchemy import delete
 
 from fastapi_user_auth.admin import AuthAdminSite
 from fastapi_user_auth.admin.utils import (
+    filter_options,
     get_admin_action_options,
     get_admin_action_options_by_subject,
     get_admin_grouping,
     update_casbin_site_grouping,
 )
 from fastapi_user_auth.auth.models import CasbinRule
+from fastapi_user_auth.utils.casbin import get_policy_version
 
 
 @pytest.fixture
@@ -102,6 +104,22 @@ def test_get_admin_action_options_by_subject(site: AuthAdminSite, admin_instance
     assert user_admin_unique_id + "#page:update_subject_roles#page" not in user_admin_options
 
 
+def test_filter_options():
+    options = [
+        {"value": "a", "children": [{"value": "a1"}, {"value": "a2"}]},
+        {"value": "b", "children": [{"value": "b1"}]},
+        {"value": "c"},
+    ]
+    # 全部允许时,返回原列表
+    assert filter_options(options, lambda item: True) is options
+    result = filter_options(options, lambda item: item["value"] in {"a", "a1", "b1"})
+    assert result == [{"value": "a", "children": [{"value": "a1"}]}, {"value": "b", "children": [{"value": "b1"}]}]
+    assert result[1] is options[1]
+    # 原选项未被修改
+    assert options[0]["children"] == [{"value": "a1"}, {"value": "a2"}]
+    assert len(options) == 3
+
+
 def test_get_admin_grouping(site: AuthAdminSite, admin_instances: dict):
     grouping = get_admin_grouping(site)
     assert (site.unique_id, admin_instances["home_admin"].unique_id) in grouping
@@ -115,3 +133,7 @@ async def test_casbin_update_site_grouping(site: AuthAdminSite, admin_instances:
     assert (site.unique_id, admin_instances["home_admin"].unique_id) in grouping
     assert (site.unique_id, admin_instances["user_auth_app"].unique_id) in grouping
     assert (admin_instances["user_auth_app"].unique_id, admin_instances["user_admin"].unique_id) in grouping
+    # 资源分组没有变化时,不更新规则
+    version = get_policy_version()
+    await update_casbin_site_grouping(site.auth.enforcer, site)
+    assert get_policy_version() == version
@@ -7,6 +7,8 @@ from fastapi_user_auth.admin.utils import update_casbin_site_grouping
 from fastapi_user_auth.auth.models import CasbinRule
 from fastapi_user_auth.utils.casbin import (
     get_subject_page_permissions,
+    permission_decode,
+    permission_encode,
     update_subject_page_permissions,
     update_subject_roles,
 )
@@ -54,6 +56,12 @@ async def fake_data(db, site, admin_instances, enforcer: AsyncEnforcer):
     await enforcer.load_policy()
 
 
+def test_permission_encode():
+    assert permission_encode("uid", "page", "page") == "uid#page#page"
+    assert permission_encode("uid", "page:list", None, "page") == "uid#page:list#page"
+    assert permission_decode(permission_encode("uid", "page:list:email", "page:list")) == ["uid", "page:list:email", "page:list"]
+
+
 async def test_casbin_get_subject_page_permissions(enforcer: AsyncEnforcer, admin_instances: dict, fake_data):
     permissions = await get_subject_page_permissions(enforcer, subject="u:admin", implicit=False)
     assert not permissions
@@ -65,6 +73,11 @@ async def test_casbin_get_subject_page_permissions(enforcer: AsyncEnforcer, admi
     assert permissions
     permissions2 = await get_subject_page_permissions(enforcer, subject="r:admin", implicit=False)
     assert permissions2 == permissions
+    # 多个角色拥有相同的权限,不重复返回
+    await enforcer.add_grouping_policy("u:admin", "r:admin2")
+    await enforcer.add_policy("r:admin2", user_admin_unique_id, "page", "page", "allow")
+    permissions3 = await get_subject_page_permissions(enforcer, subject="u:admin", implicit=True)
+    assert sorted(permissions3) == sorted(permissions)
 
 
 async def test_casbin_update_subject_roles(enforcer: AsyncEnforcer, admin_instances: dict, fake_data):